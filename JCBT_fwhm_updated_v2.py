@@ -18,12 +18,15 @@ import re
 import numpy as np
 from astropy.wcs import WCS
 import shutil
+from seeing_analytics import SeeingMonitor, correct_from_header
+from fits_loader import FrameBufferPool, load_frame
 
 # --- CONFIGURATION ---
 SOURCE_DIR = "/mnt/telescope_remote"   # Replace with your remote directory path
 LOCAL_DIR = "/home/luciferat022/test_final_30dec2025"  # Replace with your local directory path
 LIVE_DATA_CSV = os.path.join(LOCAL_DIR, "live_fwhm_data.csv") 
 TEMP_COO_FILE = os.path.join(LOCAL_DIR, "temp_sources.coo")
+SEEING_STATE_FILE = os.path.join(LOCAL_DIR, "seeing_state.json")
 
 SLEEP_INTERVAL = 3
 pixel_scale = 0.257
@@ -124,6 +127,43 @@ def capture_iraf_output(func, *args, **kwargs):
     
     return extract_iraf_fwhm_average(output)
 
+def append_csv_row(row, filename):
+    """
+    Append one row to the live CSV, matching the existing header. If the file
+    lacks some of the row's columns (e.g. written by an older version of this
+    script), it is rewritten with the union of columns so readers never see a
+    ragged file.
+    """
+    new_df = pd.DataFrame([row])
+
+    if not os.path.exists(filename):
+        new_df.to_csv(filename, index=False)
+        return
+
+    with open(filename) as f:
+        existing_cols = f.readline().strip().split(',')
+
+    if set(new_df.columns) <= set(existing_cols):
+        new_df.reindex(columns=existing_cols).to_csv(filename, mode='a', header=False, index=False)
+        return
+
+    try:
+        old_df = pd.read_csv(filename, dtype=str, keep_default_na=False)  # Copy old rows verbatim (keeps "N/A")
+    except Exception as e:
+        # Unreadable (already ragged) file: keep it aside and start a new one
+        backup = f"{filename}.{time.strftime('%Y%m%d_%H%M%S')}.bak"
+        os.replace(filename, backup)
+        print(f"Warning: Could not read {filename} ({e}). Moved to {backup}.")
+        new_df.to_csv(filename, index=False)
+        return
+
+    print(f" -> CSV columns changed. Rewriting {filename} with the new layout.")
+    columns = list(new_df.columns) + [c for c in old_df.columns if c not in new_df.columns]
+    merged = pd.concat([old_df, new_df], ignore_index=True).reindex(columns=columns)
+    tmp = filename + '.tmp'
+    merged.to_csv(tmp, index=False)
+    os.replace(tmp, filename)
+
 def main():
     if not os.path.exists(LOCAL_DIR):
         os.makedirs(LOCAL_DIR)
@@ -148,6 +188,11 @@ def main():
     iraf.digiphot() 
     iraf.obsutil()
     
+    monitor = SeeingMonitor.load_checkpoint(SEEING_STATE_FILE)
+    frame_pool = FrameBufferPool()
+    if monitor.n_samples:
+        print(f"Resumed seeing statistics from {monitor.n_samples} frame(s).")
+
     print(f"Watching {SOURCE_DIR} for files...")
 
     try:
@@ -251,41 +296,44 @@ def main():
                         d.set('scale', 'zscale')
                         time.sleep(1) 
 
-                        with pyfits.open(local_path) as hdul:
-                            header = hdul[0].header
-                            img_data = hdul[0].data
-                            # Handle 3D cubes vs 2D images
-                            if img_data.ndim == 3:
-                                img_2d = img_data[0].astype(np.float32)
-                            else:
-                                img_2d = img_data.astype(np.float32)
-
-                            bkg = sep.Background(img_2d)
-                            thresh = bkg.globalback + 3.0 * bkg.globalrms
-                            img_clean = img_2d - bkg
-
-                            neighborhood_size = 11
-                            local_maxima = maximum_filter(img_clean, size=neighborhood_size) == img_clean
-                            peaks = np.argwhere(local_maxima & (img_clean > thresh))
-                            sources_xy = peaks[:, [1, 0]]
-                            fluxes = img_clean[peaks[:, 0], peaks[:, 1]]
-
-                            print(f" -> Sources detected: {len(sources_xy)}")
-
-                            if len(sources_xy) == 0:
-                                print(" -> No stars found.")
-                                print("Proceed with next file?(y/n):")
-                                user_input = input().strip().lower()
-
-                            source_table = Table()
-                            source_table['x'] = sources_xy[:, 0] + 1
-                            source_table['y'] = sources_xy[:, 1] + 1
-                            source_table['flux'] = fluxes
-
-                            source_table1 = source_table[source_table['flux'] < 100000]
-                            brightest_15 = source_table1[np.argsort(source_table1['flux'])[::-1][:15]]
-
-                            save_brightest_as_coo(brightest_15, filename=TEMP_COO_FILE)
+                        # Memory-mapped read of the first plane straight into a pooled float32 buffer
+                        header, img_2d = load_frame(local_path, pool=frame_pool)
+
+                        # Extracts only HH:MM:SS from DATE-OBS (SPE conversions have none: use file time)
+                        raw_ut = header.get('DATE-OBS')
+                        if raw_ut:
+                            ut = str(raw_ut).replace('T', ' ').split()[-1].split('.')[0]
+                        else:
+                            ut = time.strftime('%H:%M:%S', time.gmtime(os.path.getmtime(source_path)))
+
+                        bkg = sep.Background(img_2d)
+                        thresh = bkg.globalback + 3.0 * bkg.globalrms
+                        # Subtract in place so the pooled buffer is the only full-size image
+                        bkg.subfrom(img_2d)
+                        img_clean = img_2d
+
+                        neighborhood_size = 11
+                        local_maxima = maximum_filter(img_clean, size=neighborhood_size) == img_clean
+                        peaks = np.argwhere(local_maxima & (img_clean > thresh))
+                        sources_xy = peaks[:, [1, 0]]
+                        fluxes = img_clean[peaks[:, 0], peaks[:, 1]]
+
+                        print(f" -> Sources detected: {len(sources_xy)}")
+
+                        if len(sources_xy) == 0:
+                            print(" -> No stars found.")
+                            print("Proceed with next file?(y/n):")
+                            user_input = input().strip().lower()
+
+                        source_table = Table()
+                        source_table['x'] = sources_xy[:, 0] + 1
+                        source_table['y'] = sources_xy[:, 1] + 1
+                        source_table['flux'] = fluxes
+
+                        source_table1 = source_table[source_table['flux'] < 100000]
+                        brightest_15 = source_table1[np.argsort(source_table1['flux'])[::-1][:15]]
+
+                        save_brightest_as_coo(brightest_15, filename=TEMP_COO_FILE)
                         
                         # Fixed the missing comma syntax error here
                         results = capture_iraf_output(
@@ -303,20 +351,35 @@ def main():
 
                         if results:
                             print(f" -> Measured FWHM: {results['average_fwhm_pixels']:.2f} px")
+
+                            # --- SEEING ANALYTICS (zenith, 500 nm) ---
+                            fwhm_zenith, airmass, wavelength = correct_from_header(results['average_fwhm_arcsec'], header)
+                            stats, alerts = monitor.update(fwhm_zenith, results['average_ellipticity'], local_fname)
+                            monitor.save_checkpoint(SEEING_STATE_FILE)
+                            print(f" -> Zenith 500nm FWHM: {fwhm_zenith:.2f}\" (median {stats['FWHM_MEDIAN']:.2f}\", clipped {stats['FWHM_CLIP_MEAN']:.2f} +/- {stats['FWHM_CLIP_STD']:.2f}\")")
+                            for alert in alerts:
+                                print(f" !! ALERT: {alert}")
                             
                             new_row = {
                                 'FILENAME': local_fname,
+                                'UT': ut,
                                 'FOCUS': focus if action == 'convert' else 'N/A', # Focus only relevant for SPE
                                 'ELLIPTICITY': results['average_ellipticity'],
                                 'FWHM_PIX': results['average_fwhm_pixels'],
                                 'FWHM_ARCSEC': results['average_fwhm_arcsec'],
-                                'N_STARS': results['n_stars']
+                                'N_STARS': results['n_stars'],
+                                'AIRMASS': airmass,
+                                'WAVELENGTH_NM': wavelength,
+                                'FWHM_ZENITH_500': fwhm_zenith,
+                                'FWHM_MEDIAN': stats['FWHM_MEDIAN'],
+                                'FWHM_EWMA': stats['FWHM_EWMA'],
+                                'FWHM_CLIP_MEAN': stats['FWHM_CLIP_MEAN'],
+                                'FWHM_CLIP_STD': stats['FWHM_CLIP_STD'],
+                                'FWHM_SLOPE': stats['FWHM_SLOPE'],
+                                'ALERTS': '; '.join(alerts)
                             }
                             
-                            if not os.path.exists(LIVE_DATA_CSV):
-                                pd.DataFrame([new_row]).to_csv(LIVE_DATA_CSV, index=False)
-                            else:
-                                pd.DataFrame([new_row]).to_csv(LIVE_DATA_CSV, mode='a', header=False, index=False)
+                            append_csv_row(new_row, LIVE_DATA_CSV)
                         else:
                             print(" -> No valid FWHM returned from IRAF.")
                         
@@ -0,0 +1,109 @@
+import astropy.io.fits as pyfits
+import numpy as np
+
+
+class FrameBufferPool:
+    """
+    Preallocated float32 buffers keyed by image shape. Frames of the same
+    size reuse one buffer, so the loop does not allocate a new image per file.
+    The returned array is overwritten by the next frame of the same shape.
+    """
+
+    def __init__(self, max_shapes=4):
+        self.max_shapes = max_shapes
+        self.buffers = {}
+
+    def get(self, shape):
+        shape = tuple(int(n) for n in shape)
+        buf = self.buffers.get(shape)
+        if buf is None:
+            if len(self.buffers) >= self.max_shapes:
+                # Drop the oldest shape (dicts keep insertion order)
+                self.buffers.pop(next(iter(self.buffers)))
+            buf = np.empty(shape, dtype=np.float32)
+            self.buffers[shape] = buf
+        return buf
+
+
+def _image_hdu(hdul, ext):
+    """
+    hdul[ext] if `ext` is given (it must hold an image), otherwise the first
+    HDU from the start of the file with NAXIS >= 2.
+    """
+    if ext is not None:
+        hdu = hdul[ext]
+        if not hdu.is_image or hdu.header.get('NAXIS', 0) < 2:
+            raise ValueError(f"HDU {ext!r} is not an image with NAXIS >= 2.")
+        return hdu
+    for hdu in hdul:
+        if hdu.is_image and hdu.header.get('NAXIS', 0) >= 2:
+            return hdu
+    raise ValueError("No image HDU with NAXIS >= 2 found.")
+
+
+def load_frame(filepath, ext=None, plane=0, section=None, pool=None):
+    """
+    Loads one 2D frame as float32 with minimal peak memory.
+
+    Uncompressed FITS is memory-mapped with scaling disabled, so only the
+    requested cube plane / section is read from disk, and it is converted
+    straight into a (pooled) float32 buffer. BSCALE/BZERO are then applied
+    in place, and BLANK pixels of scaled integer images are set to NaN (as
+    hdu.data would). Tile-compressed HDUs fall back to their decompressed section.
+
+    plane: index along the cube axis (NAXIS3); must be 0 for 2D images.
+    section: optional (y0, y1, x0, x1) pixel box (0-based, end exclusive).
+    Returns (header, img_2d).
+    """
+    with pyfits.open(filepath, memmap=True, do_not_scale_image_data=True) as hdul:
+        hdu = _image_hdu(hdul, ext)
+        header = hdu.header.copy()
+
+        # Compressed HDUs cannot be memory-mapped; .section decompresses only what is sliced
+        source = hdu.section if isinstance(hdu, pyfits.CompImageHDU) else hdu.data
+        if source is None:
+            raise ValueError(f"HDU has no data: {filepath}")
+
+        # Handle 3D cubes vs 2D images without touching the other planes.
+        # For NAXIS > 3 the extra leading axes are taken at 0.
+        ndim = header.get('NAXIS', len(source.shape))
+        if ndim > 2:
+            index = (0,) * (ndim - 3) + (plane,)
+        elif plane != 0:
+            raise ValueError(f"plane={plane} requested but {filepath} is a 2D image.")
+        else:
+            index = ()
+        if section is not None:
+            y0, y1, x0, x1 = section
+            index += (slice(y0, y1), slice(x0, x1))
+        raw = source[index] if index else source[...]
+
+        bscale = header.get('BSCALE', 1.0)
+        bzero = header.get('BZERO', 0.0)
+        scaled = bscale != 1.0 or bzero != 0.0
+
+        # Scaled integer images: BLANK pixels become NaN, as astropy does when it scales
+        blank = header.get('BLANK')
+        blank_mask = None
+        if scaled and blank is not None and header.get('BITPIX', 0) > 0:
+            blank_mask = raw == blank
+            if not blank_mask.any():
+                blank_mask = None
+
+        img_2d = pool.get(raw.shape) if pool is not None else np.empty(raw.shape, dtype=np.float32)
+        # Big-endian -> native float32 conversion in a single pass
+        np.copyto(img_2d, raw, casting='unsafe')
+        del raw, source
+
+    if bscale != 1.0:
+        img_2d *= np.float32(bscale)
+    if bzero != 0.0:
+        img_2d += np.float32(bzero)
+    if blank_mask is not None:
+        img_2d[blank_mask] = np.nan
+
+    # The buffer now holds physical values
+    for key in ('BSCALE', 'BZERO') + (('BLANK',) if scaled else ()):
+        header.remove(key, ignore_missing=True)
+
+    return header, img_2d
@@ -35,6 +35,12 @@ def animate(i):
         # Plot FWHM (Arcsec)
         ax.plot(df['datetime'], df['FWHM_ARCSEC'], 'o-', color='#00ff00', linewidth=2, markersize=5, label='FWHM (arcsec)')
 
+        # Zenith / 500 nm corrected seeing and its running median (if the pipeline wrote them)
+        if 'FWHM_ZENITH_500' in df.columns:
+            ax.plot(df['datetime'], df['FWHM_ZENITH_500'], 's--', color='#ffaa00', linewidth=1, markersize=4, label='Zenith 500nm (arcsec)')
+        if 'FWHM_MEDIAN' in df.columns:
+            ax.plot(df['datetime'], df['FWHM_MEDIAN'], '-', color='white', linewidth=1.5, alpha=0.7, label='Running median')
+
         # Formatting
         ax.set_title(f"Real-Time Seeing Monitor (N={len(df)})", fontsize=14, color='white')
         ax.set_xlabel("UT Time", fontsize=12)
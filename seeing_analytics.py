@@ -0,0 +1,484 @@
+import bisect
+import json
+import math
+import os
+from collections import deque
+
+# --- CONFIGURATION ---
+REFERENCE_WAVELENGTH_NM = 500.0
+MIN_WAVELENGTH_NM = 300.0   # Numeric FILTER values outside this range are
+MAX_WAVELENGTH_NM = 1100.0  # treated as wheel slots, not wavelengths
+WINDOW_SIZE = 15            # Frames kept for rolling median / clipped stats
+EWMA_ALPHA = 0.3
+CLIP_SIGMA = 3.0
+CLIP_ITERS = 3
+
+SEEING_LIMIT_ARCSEC = 2.5   # Threshold alert on zenith-corrected FWHM
+ELLIPTICITY_LIMIT = 0.2     # Threshold alert on average ellipticity
+SEEING_TREND_LIMIT = 0.03   # arcsec per frame (rolling slope)
+ELLIP_TREND_LIMIT = 0.01    # per frame (rolling slope)
+MIN_TREND_SAMPLES = 5
+ALERT_CONSECUTIVE = 3       # Frames in a row over a threshold before alerting
+
+# Effective wavelengths (nm) for the filters we are likely to see in headers
+FILTER_WAVELENGTHS_NM = {
+    'U': 365.0, 'B': 445.0, 'V': 551.0, 'R': 658.0, 'I': 806.0,
+    'u': 354.0, 'g': 477.0, 'r': 623.0, 'i': 763.0, 'z': 913.0,
+    'H-ALPHA': 656.3, 'HA': 656.3, 'OIII': 500.7, 'SII': 671.6,
+    'CLEAR': 550.0, 'L': 550.0,
+}
+
+
+def filter_wavelength(filter_name):
+    """
+    Returns the effective wavelength (nm) for a FILTER header value.
+    Accepts names like 'V', 'Bessell R', "r'", 'SDSS g', or a wavelength in nm.
+    Returns None if unknown, so the wavelength term is left uncorrected.
+    """
+    if filter_name is None:
+        return None
+    name = str(filter_name).strip().replace("'", "").replace('_', ' ')
+    if not name:
+        return None
+
+    for key in (name, name.upper(), name.lower()):
+        if key in FILTER_WAVELENGTHS_NM:
+            return FILTER_WAVELENGTHS_NM[key]
+
+    # 'Bessell V', 'SDSS r', 'Johnson-B' -> last token
+    last = name.replace('-', ' ').split()[-1]
+    for key in (last, last.upper(), last.lower()):
+        if key in FILTER_WAVELENGTHS_NM:
+            return FILTER_WAVELENGTHS_NM[key]
+
+    try:
+        # Numeric filter names in nm (e.g. '500'); small numbers are filter-wheel slots
+        wavelength = float(last)
+    except ValueError:
+        return None
+    if MIN_WAVELENGTH_NM <= wavelength <= MAX_WAVELENGTH_NM:
+        return wavelength
+    return None
+
+
+def airmass_from_header(header):
+    """
+    Airmass from the AIRMASS keyword, falling back to the secant of the
+    zenith distance derived from ALT / ELEVATIO / ZD. Returns None if absent.
+    """
+    value = header.get('AIRMASS')
+    try:
+        airmass = float(value)
+        if airmass >= 1.0:
+            return airmass
+    except (TypeError, ValueError):
+        pass
+
+    for key in ('ALT', 'ELEVATIO', 'ELEVAT'):
+        try:
+            alt = float(header.get(key))
+        except (TypeError, ValueError):
+            continue
+        if 0.0 < alt <= 90.0:
+            return 1.0 / math.cos(math.radians(90.0 - alt))
+
+    try:
+        zd = float(header.get('ZD'))
+        if 0.0 <= zd < 90.0:
+            return 1.0 / math.cos(math.radians(zd))
+    except (TypeError, ValueError):
+        pass
+
+    return None
+
+
+def correct_to_zenith(fwhm_arcsec, airmass=None, wavelength_nm=None):
+    """
+    Scales a measured FWHM to zenith at 500 nm (Kolmogorov turbulence):
+        FWHM ~ airmass^0.6 * wavelength^-0.2
+    Missing airmass / wavelength leave that term uncorrected.
+    """
+    corrected = float(fwhm_arcsec)
+    if airmass is not None and airmass >= 1.0:
+        corrected *= airmass ** -0.6
+    if wavelength_nm is not None and wavelength_nm > 0:
+        corrected *= (wavelength_nm / REFERENCE_WAVELENGTH_NM) ** 0.2
+    return corrected
+
+
+def correct_from_header(fwhm_arcsec, header):
+    """Zenith / 500 nm corrected FWHM using AIRMASS and FILTER header keywords"""
+    airmass = airmass_from_header(header)
+    wavelength = filter_wavelength(header.get('FILTER'))
+    return correct_to_zenith(fwhm_arcsec, airmass, wavelength), airmass, wavelength
+
+
+class RunningMedian:
+    """
+    Median over the last `window` samples. Each update costs a bisect on a
+    sorted window, so it is constant per sample regardless of history length.
+    """
+
+    def __init__(self, window=WINDOW_SIZE):
+        self.window = window
+        self.values = deque()
+        self.sorted_values = []
+
+    def update(self, x):
+        self.values.append(x)
+        bisect.insort(self.sorted_values, x)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            del self.sorted_values[bisect.bisect_left(self.sorted_values, old)]
+        return self.median
+
+    @property
+    def median(self):
+        n = len(self.sorted_values)
+        if n == 0:
+            return None
+        mid = n // 2
+        if n % 2:
+            return self.sorted_values[mid]
+        return 0.5 * (self.sorted_values[mid - 1] + self.sorted_values[mid])
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['window'])
+        for x in state['values']:
+            obj.update(x)
+        return obj
+
+
+class EWMA:
+    """Exponentially weighted moving average and variance"""
+
+    def __init__(self, alpha=EWMA_ALPHA):
+        self.alpha = alpha
+        self.mean = None
+        self.var = 0.0
+
+    def update(self, x):
+        if self.mean is None:
+            self.mean = x
+            self.var = 0.0
+        else:
+            diff = x - self.mean
+            incr = self.alpha * diff
+            self.mean += incr
+            self.var = (1.0 - self.alpha) * (self.var + diff * incr)
+        return self.mean
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+    def to_dict(self):
+        return {'alpha': self.alpha, 'mean': self.mean, 'var': self.var}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['alpha'])
+        obj.mean = state['mean']
+        obj.var = state['var']
+        return obj
+
+
+class RollingStats:
+    """
+    Sigma-clipped mean / std and least-squares slope (per sample) over the
+    last `window` samples. The mean / std clip around the median with a
+    MAD-based sigma. The slope clips on residuals from the linear fit, so a
+    genuine ramp or step is kept while an isolated bad frame is rejected.
+    """
+
+    def __init__(self, window=WINDOW_SIZE, sigma=CLIP_SIGMA, iters=CLIP_ITERS):
+        self.window = window
+        self.sigma = sigma
+        self.iters = iters
+        self.values = deque()
+        self.count = 0          # Total samples seen (x coordinate of the next one)
+        self._clipped = (None, None, 0)
+        self._slope = None
+
+    def update(self, y):
+        self.values.append(y)
+        if len(self.values) > self.window:
+            self.values.popleft()
+        self.count += 1
+        self._refresh()
+
+    def _refresh(self):
+        """Clip and fit once per sample; clipped() / slope() return these results"""
+        self._clipped = self._compute_clipped()
+        self._slope = self._compute_slope()
+
+    def _clip(self):
+        """(x, y) pairs of the window that survive iterative median/MAD clipping"""
+        x0 = self.count - len(self.values)
+        kept = [(x0 + k, y) for k, y in enumerate(self.values)]
+        for _ in range(self.iters):
+            ys = sorted(y for _, y in kept)
+            center = _median(ys)
+            scale = 1.4826 * _median(sorted(abs(y - center) for y in ys))
+            if scale == 0:
+                # More than half the window is identical: nothing to clip against
+                break
+            new = [(x, y) for x, y in kept if abs(y - center) <= self.sigma * scale]
+            if len(new) == len(kept) or not new:
+                break
+            kept = new
+        return kept
+
+    def clipped(self):
+        """Returns (mean, std, n_kept) after iterative sigma clipping"""
+        return self._clipped
+
+    def slope(self):
+        """Least-squares slope per sample after clipping on fit residuals (None if < 2 samples)"""
+        return self._slope
+
+    def _compute_clipped(self):
+        if not self.values:
+            return None, None, 0
+        ys = [y for _, y in self._clip()]
+        n = len(ys)
+        mean = sum(ys) / n
+        std = math.sqrt(sum((v - mean) ** 2 for v in ys) / n)
+        return mean, std, n
+
+    def _compute_slope(self):
+        if len(self.values) < 2:
+            return None
+        x0 = self.count - len(self.values)
+        kept = [(x0 + k, y) for k, y in enumerate(self.values)]
+        # Robust starting line, so a high-leverage bad frame cannot hide in its own fit
+        slope, intercept = _theil_sen(kept)
+        for _ in range(self.iters):
+            residuals = [y - (intercept + slope * x) for x, y in kept]
+            center = _median(sorted(residuals))
+            scale = 1.4826 * _median(sorted(abs(r - center) for r in residuals))
+            if scale == 0:
+                break
+            new = [p for p, r in zip(kept, residuals) if abs(r - center) <= self.sigma * scale]
+            if len(new) == len(kept) or len(new) < 2:
+                break
+            kept = new
+            slope, intercept = _fit_line(kept)
+        return slope
+
+    def trailing_above(self, limit):
+        """Number of most recent samples in a row that exceed `limit`"""
+        n = 0
+        for y in reversed(self.values):
+            if y <= limit:
+                break
+            n += 1
+        return n
+
+    def to_dict(self):
+        return {
+            'window': self.window, 'sigma': self.sigma, 'iters': self.iters,
+            'values': list(self.values), 'count': self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['window'], state['sigma'], state['iters'])
+        obj.values = deque(state['values'])
+        obj.count = state['count']
+        obj._refresh()
+        return obj
+
+
+def _fit_line(points):
+    """Least-squares (slope, intercept) through (x, y) points with distinct x"""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / sxx
+    return slope, mean_y - slope * mean_x
+
+
+def _theil_sen(points):
+    """Median of pairwise slopes (slope, intercept): robust to isolated outliers"""
+    slopes = sorted((y2 - y1) / (x2 - x1)
+                    for i, (x1, y1) in enumerate(points) for x2, y2 in points[i + 1:])
+    slope = _median(slopes)
+    return slope, _median(sorted(y - slope * x for x, y in points))
+
+
+def _median(sorted_values):
+    n = len(sorted_values)
+    mid = n // 2
+    if n % 2:
+        return sorted_values[mid]
+    return 0.5 * (sorted_values[mid - 1] + sorted_values[mid])
+
+
+class SeeingMonitor:
+    """
+    Streaming seeing analytics: zenith/500 nm corrected FWHM and ellipticity
+    are fed frame by frame; update() returns the current statistics and any
+    threshold or trend alerts. State round-trips through a JSON checkpoint.
+    """
+
+    def __init__(self, window=WINDOW_SIZE, alpha=EWMA_ALPHA):
+        self.n_samples = 0
+        self.last_filename = None
+        self.fwhm_median = RunningMedian(window)
+        self.fwhm_ewma = EWMA(alpha)
+        self.fwhm_stats = RollingStats(window)
+        self.ellip_median = RunningMedian(window)
+        self.ellip_ewma = EWMA(alpha)
+        self.ellip_stats = RollingStats(window)
+
+    def update(self, fwhm_zenith, ellipticity=None, filename=None):
+        self.n_samples += 1
+        self.last_filename = filename
+
+        self.fwhm_median.update(fwhm_zenith)
+        self.fwhm_ewma.update(fwhm_zenith)
+        self.fwhm_stats.update(fwhm_zenith)
+
+        if ellipticity is not None:
+            self.ellip_median.update(ellipticity)
+            self.ellip_ewma.update(ellipticity)
+            self.ellip_stats.update(ellipticity)
+
+        return self.summary(), self.check_alerts()
+
+    def summary(self):
+        fwhm_mean, fwhm_std, _ = self.fwhm_stats.clipped()
+        ellip_mean, ellip_std, _ = self.ellip_stats.clipped()
+        return {
+            'FWHM_MEDIAN': self.fwhm_median.median,
+            'FWHM_EWMA': self.fwhm_ewma.mean,
+            'FWHM_CLIP_MEAN': fwhm_mean,
+            'FWHM_CLIP_STD': fwhm_std,
+            'FWHM_SLOPE': self.fwhm_stats.slope(),
+            'ELLIP_MEDIAN': self.ellip_median.median,
+            'ELLIP_EWMA': self.ellip_ewma.mean,
+            'ELLIP_CLIP_MEAN': ellip_mean,
+            'ELLIP_CLIP_STD': ellip_std,
+            'ELLIP_SLOPE': self.ellip_stats.slope(),
+        }
+
+    def check_alerts(self):
+        """
+        Threshold alerts once ALERT_CONSECUTIVE frames in a row exceed the limit
+        (a single bad frame does not fire), trend alerts on the residual-clipped slope.
+        """
+        alerts = []
+
+        n_over = self.fwhm_stats.trailing_above(SEEING_LIMIT_ARCSEC)
+        if n_over >= ALERT_CONSECUTIVE:
+            alerts.append(f"Seeing above limit: {self.fwhm_stats.values[-1]:.2f}\" > {SEEING_LIMIT_ARCSEC:.2f}\" "
+                          f"for {n_over} frames (zenith 500nm)")
+
+        n_over = self.ellip_stats.trailing_above(ELLIPTICITY_LIMIT)
+        if n_over >= ALERT_CONSECUTIVE:
+            alerts.append(f"Ellipticity above limit: {self.ellip_stats.values[-1]:.3f} > {ELLIPTICITY_LIMIT:.3f} "
+                          f"for {n_over} frames (wind shake / tracking?)")
+
+        if len(self.fwhm_stats.values) >= MIN_TREND_SAMPLES:
+            slope = self.fwhm_stats.slope()
+            if slope is not None and slope > SEEING_TREND_LIMIT:
+                alerts.append(f"Seeing degrading: +{slope:.3f}\"/frame over last {len(self.fwhm_stats.values)} frames")
+
+        if len(self.ellip_stats.values) >= MIN_TREND_SAMPLES:
+            slope = self.ellip_stats.slope()
+            if slope is not None and slope > ELLIP_TREND_LIMIT:
+                alerts.append(f"Ellipticity rising: +{slope:.4f}/frame (wind shake / tracking?)")
+
+        return alerts
+
+    def to_dict(self):
+        return {
+            'n_samples': self.n_samples,
+            'last_filename': self.last_filename,
+            'fwhm_median': self.fwhm_median.to_dict(),
+            'fwhm_ewma': self.fwhm_ewma.to_dict(),
+            'fwhm_stats': self.fwhm_stats.to_dict(),
+            'ellip_median': self.ellip_median.to_dict(),
+            'ellip_ewma': self.ellip_ewma.to_dict(),
+            'ellip_stats': self.ellip_stats.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls()
+        obj.n_samples = state['n_samples']
+        obj.last_filename = state['last_filename']
+        obj.fwhm_median = RunningMedian.from_dict(state['fwhm_median'])
+        obj.fwhm_ewma = EWMA.from_dict(state['fwhm_ewma'])
+        obj.fwhm_stats = RollingStats.from_dict(state['fwhm_stats'])
+        obj.ellip_median = RunningMedian.from_dict(state['ellip_median'])
+        obj.ellip_ewma = EWMA.from_dict(state['ellip_ewma'])
+        obj.ellip_stats = RollingStats.from_dict(state['ellip_stats'])
+        return obj
+
+    def save_checkpoint(self, filename):
+        """Atomically write the monitor state as JSON"""
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load_checkpoint(cls, filename, window=WINDOW_SIZE, alpha=EWMA_ALPHA):
+        """
+        Restore from a checkpoint, or start fresh if it is missing / unreadable.
+        A checkpoint saved with a different window or alpha is discarded, since
+        its rolling state does not match the requested configuration.
+        """
+        if not os.path.exists(filename):
+            return cls(window, alpha)
+        try:
+            with open(filename) as f:
+                monitor = cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Warning: Could not read checkpoint {filename} ({e}). Starting fresh.")
+            return cls(window, alpha)
+
+        if monitor.fwhm_stats.window != window or monitor.fwhm_ewma.alpha != alpha:
+            print(f"Warning: Checkpoint {filename} uses window={monitor.fwhm_stats.window}, "
+                  f"alpha={monitor.fwhm_ewma.alpha} (requested {window}, {alpha}). Starting fresh.")
+            return cls(window, alpha)
+        return monitor
+
+
+if __name__ == "__main__":
+    # Quick self-check of the alert logic on synthetic sequences
+    def run(fwhms):
+        monitor = SeeingMonitor()
+        history = [monitor.update(f)[1] for f in fwhms]
+        return monitor, history
+
+    flat = [1.0, 1.02, 0.98, 1.01, 0.99, 1.0, 1.03, 0.97]
+
+    # Ramp: 8 frames near 1.0", then 1.1 -> 1.7" over 7 frames
+    monitor, history = run(flat + [1.1 + 0.1 * i for i in range(7)])
+    assert monitor.fwhm_stats.slope() > SEEING_TREND_LIMIT
+    assert any('Seeing degrading' in a for a in history[-1]), history[-1]
+
+    # Step: 15 frames near 1.0", then ~3.0"; fires after ALERT_CONSECUTIVE frames
+    monitor, history = run(flat + flat[:7] + [3.0, 3.02, 2.98, 3.01])
+    assert not any('above limit' in a for a in history[-3])
+    assert any('above limit' in a for a in history[-2]), history[-2]
+
+    # Single 2" outlier at the newest position: no alerts
+    monitor, history = run(flat + flat[:6] + [3.0])
+    assert history[-1] == [], history[-1]
+    monitor, history = run(flat[:4] + [3.0])
+    assert history[-1] == [], history[-1]
+
+    # Over half the window identical: the new samples must not be clipped away
+    monitor, history = run([1.0] * 8 + [1.1 + 0.1 * i for i in range(7)])
+    assert monitor.fwhm_stats.clipped()[2] == 15 and monitor.fwhm_stats.slope() > 0
+
+    print("seeing_analytics self-check passed.")